@@ -4,7 +4,7 @@
 watch_nevada_secret.py — Monitor aerei con poligoni precisi (point-in-polygon).
 Aggiunge:
  - supporto a poligoni (GeoJSON o JSON semplice)
- - algoritmo ray-casting (no dipendenze)
+ - algoritmo ray-casting vettorizzato (NumPy)
  - gestione rate-limit globale tramite lockfile
  - parsing sicuro dei tipi numerici (altitudine, velocità, coordinate)
  - notifiche Telegram con link diretti (HEX / FLT / REG / POS)
@@ -14,15 +14,52 @@ import argparse
 import csv
 import datetime as dt
 import fnmatch
+import functools
+import hashlib
 import json
 import os
+import queue
+import random
+import re
 import sys
+import threading
 import time
+from email.utils import parsedate_to_datetime
 import fcntl   # 🔹 gestione lockfile per rate limit
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from numba import njit, prange   # 🔹 JIT opzionale per i kernel PIP
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range   # fallback: i kernel restano eseguibili in puro Python
+
+try:
+    import shapely   # 🔹 opzionale: contains_xy su geometrie preparate (GEOS)
+    HAVE_SHAPELY = hasattr(shapely, "contains_xy")
+except ImportError:
+    HAVE_SHAPELY = False
+
+try:
+    import orjson    # 🔹 opzionale: parse JSON ~3x più veloce dello stdlib
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Anello di poligono in formato SoA: bbox (min_lat, max_lat, min_lon, max_lon),
+# due array contigui (lat, lon) con il primo vertice duplicato in coda per
+# chiudere l'anello, e gli array per-lato (yi, yj, xi, dy, dx) precalcolati
+# una volta al load (la geometria è costante per tutta la vita del processo).
+Bbox = Tuple[float, float, float, float]
+Edges = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+Ring = Tuple[Bbox, np.ndarray, np.ndarray, Edges]
 
 # ---------------------------
 # Tiles / API config
@@ -51,10 +88,14 @@ HTTP_TIMEOUT = 15
 HTTP_RETRIES = 2
 HTTP_BACKOFF = 2.0
 
+# 🔹 Sessione condivisa: keep-alive tra i poll, niente handshake TLS ripetuti.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+
 # ---------------------------
 # Dataclasses
 # ---------------------------
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Aircraft:
     hex: str
     flight: str
@@ -71,73 +112,553 @@ class Aircraft:
 # ---------------------------
 # Rate limiting con lockfile
 # ---------------------------
+_LOCK_PATH = "/tmp/adsbfi_api.lock"
+_LOCK_FD: Optional[int] = None
+# flock è per open-file-description: con un solo fd condiviso non separa i
+# thread dello stesso processo, quindi serve anche un lock in-process.
+_LOCK_TLOCK = threading.Lock()
+# ultima chiamata fatta da QUESTO processo, su clock monotonico (immune ai
+# salti NTP): se è recente, lo slot si calcola senza toccare il lockfile.
+_LAST_MONO = 0.0
+# 🔹 Il lockfile serve solo con più istanze sulla stessa macchina (caso
+# raro): di default basta il token bucket in-process, zero syscall.
+_MULTIPROC = os.getenv("WATCH_NEVADA_MULTIPROC") == "1"
+
+def _lock_fd() -> int:
+    global _LOCK_FD
+    if _LOCK_FD is None:
+        _LOCK_FD = os.open(_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o666)
+    return _LOCK_FD
+
 def api_rate_guard():
     """
     Garantisce che solo una richiesta API al secondo venga fatta
     da tutte le istanze in esecuzione.
-    Usa un lockfile in /tmp per coordinare i processi.
+    Di default coordina solo i thread di questo processo (lock + clock
+    monotonico); con WATCH_NEVADA_MULTIPROC=1 coordina anche più processi
+    tramite lockfile in /tmp — il fd resta aperto per la vita del processo
+    (niente open/close per ogni richiesta) e lettura/scrittura passano da
+    pread/pwrite senza buffering Python.
     """
-    lockfile = "/tmp/adsbfi_api.lock"
-    with open(lockfile, "a+") as f:
-        fcntl.flock(f, fcntl.LOCK_EX)   # lock esclusivo
-        f.seek(0)
+    global _LAST_MONO
+    with _LOCK_TLOCK:
+        # Percorso veloce: se l'ultima chiamata è di questo processo ed è
+        # recente, basta il clock monotonico — zero syscall sul file.
+        mono = time.monotonic()
+        if _LAST_MONO and mono - _LAST_MONO < 1.05:
+            time.sleep(1.05 - (mono - _LAST_MONO))
+            _LAST_MONO = time.monotonic()
+            return
+        if not _MULTIPROC:
+            _LAST_MONO = time.monotonic()
+            return
+
+        fd = _lock_fd()
+        fcntl.flock(fd, fcntl.LOCK_EX)   # lock esclusivo
         try:
-            last = float(f.read().strip())
-        except Exception:
-            last = 0.0
-
-        now = time.time()
-        delta = now - last
-        if delta < 1.05:  # se <1s dall’ultima chiamata, aspetta
-            time.sleep(1.05 - delta)
-
-        # aggiorna il timestamp
-        f.seek(0)
-        f.truncate()
-        f.write(str(time.time()))
-        f.flush()
-        fcntl.flock(f, fcntl.LOCK_UN)
+            try:
+                last = float(os.pread(fd, 64, 0).decode().strip() or "0")
+            except (ValueError, OSError):
+                last = 0.0
+
+            delta = time.time() - last
+            # delta negativo = wall clock tornato indietro: non dormire
+            # (con il vecchio codice poteva diventare un'attesa enorme)
+            if 0.0 <= delta < 1.05:
+                time.sleep(1.05 - delta)
+
+            # aggiorna il timestamp (padding fisso: sovrascrive i residui)
+            os.pwrite(fd, repr(time.time()).encode().ljust(32), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        _LAST_MONO = time.monotonic()
 
 # ---------------------------
 # Point-in-polygon (ray-casting)
 # ---------------------------
-def point_in_ring(point: Tuple[float, float], ring: List[Tuple[float, float]]) -> bool:
+def make_ring(points: List[Tuple[float, float]]) -> Ring:
+    """
+    Converte una lista di vertici (lat, lon) in bbox + due array NumPy
+    contigui, chiudendo l'anello (ultimo vertice = primo) così che le coppie
+    di lati siano semplicemente (arr[:-1], arr[1:]).
+    """
+    lats = np.asarray([p[0] for p in points], dtype=np.float64)
+    lons = np.asarray([p[1] for p in points], dtype=np.float64)
+    if len(lats) == 0 or lats[0] != lats[-1] or lons[0] != lons[-1]:
+        lats = np.append(lats, lats[:1])
+        lons = np.append(lons, lons[:1])
+    return _finish_ring(np.ascontiguousarray(lats), np.ascontiguousarray(lons))
+
+def _finish_ring(lats: np.ndarray, lons: np.ndarray) -> Ring:
+    """Completa un anello chiuso con bbox e array per-lato precalcolati."""
+    bbox = (float(lats.min()), float(lats.max()), float(lons.min()), float(lons.max()))
+    yi, yj = lats[:-1], lats[1:]
+    xi = lons[:-1]
+    edges = (yi, yj, xi, yj - yi, lons[1:] - xi)
+    return (bbox, lats, lons, edges)
+
+def _wn_ring(y: float, x: float, lats: np.ndarray, lons: np.ndarray) -> bool:
+    """
+    Winding number per quadranti (metodo PolyCARP): ogni vertice viene
+    classificato nel suo quadrante rispetto al punto (codice a 2 bit) e si
+    accumula il salto di quadrante lato per lato. Niente divisioni, niente
+    fudge 1e-12: solo il caso quadrante-opposto richiede un determinante.
+    """
+    total = 0
+    n = lats.shape[0]
+    for i in range(n - 1):
+        ty = lats[i] - y
+        tx = lons[i] - x
+        ny = lats[i + 1] - y
+        nx = lons[i + 1] - x
+        # quadrante: 0=(+,+) 1=(-,+) 2=(-,-) 3=(+,-) rispetto a (x, y)
+        qt = (0 if tx >= 0.0 else 1) if ty >= 0.0 else (3 if tx >= 0.0 else 2)
+        qn = (0 if nx >= 0.0 else 1) if ny >= 0.0 else (3 if nx >= 0.0 else 2)
+        d = (qn - qt) & 3
+        if d == 1:
+            total += 1
+        elif d == 3:
+            total -= 1
+        elif d == 2:
+            # quadranti opposti: il segno del prodotto vettoriale decide
+            # da che parte del punto passa il lato
+            det = tx * ny - nx * ty
+            total += 2 if det > 0.0 else -2
+    return total == 4 or total == -4
+
+if HAVE_NUMBA:
+    _wn_ring = njit(cache=True, fastmath=True)(_wn_ring)
+
+def _batch_pip_kernel(pts_lat: np.ndarray, pts_lon: np.ndarray,
+                      vlats: np.ndarray, vlons: np.ndarray,
+                      ring_off: np.ndarray, poly_off: np.ndarray,
+                      ring_bbox: np.ndarray, out: np.ndarray) -> None:
+    """Kernel batch su layout CSR: tutti gli anelli concatenati in vlats/
+    vlons, ring_off delimita i vertici di ogni anello, poly_off gli anelli
+    di ogni poligono (il primo è l'esterno, gli altri buchi). Con numba il
+    loop sui punti gira in prange multi-core."""
+    n_polys = poly_off.shape[0] - 1
+    for i in prange(pts_lat.shape[0]):
+        y = pts_lat[i]
+        x = pts_lon[i]
+        found = False
+        for p in range(n_polys):
+            if found:
+                break
+            r0 = poly_off[p]
+            if not (ring_bbox[r0, 0] <= y <= ring_bbox[r0, 1] and
+                    ring_bbox[r0, 2] <= x <= ring_bbox[r0, 3]):
+                continue
+            if _wn_ring(y, x, vlats[ring_off[r0]:ring_off[r0 + 1]],
+                        vlons[ring_off[r0]:ring_off[r0 + 1]]):
+                inside = True
+                for r in range(r0 + 1, poly_off[p + 1]):
+                    if _wn_ring(y, x, vlats[ring_off[r]:ring_off[r + 1]],
+                                vlons[ring_off[r]:ring_off[r + 1]]):
+                        inside = False
+                        break
+                found = inside
+        out[i] = found
+
+if HAVE_NUMBA:
+    _batch_pip_kernel = njit(cache=True, parallel=True, fastmath=True)(_batch_pip_kernel)
+
+def pack_polygons_csr(polygons: List[List[Ring]]):
+    """Impacchetta tutti gli anelli in arrays CSR per _batch_pip_kernel."""
+    vlats_parts, vlons_parts, ring_off, poly_off, bboxes = [], [], [0], [0], []
+    for poly in polygons:
+        for ring in poly:
+            vlats_parts.append(ring[1])
+            vlons_parts.append(ring[2])
+            ring_off.append(ring_off[-1] + len(ring[1]))
+            bboxes.append(ring[0])
+        poly_off.append(poly_off[-1] + len(poly))
+    if not vlats_parts:
+        return None
+    return (np.concatenate(vlats_parts), np.concatenate(vlons_parts),
+            np.asarray(ring_off, dtype=np.int64), np.asarray(poly_off, dtype=np.int64),
+            np.asarray(bboxes, dtype=np.float64))
+
+def warm_pip_kernel() -> None:
+    """Compila il kernel JIT una volta all'avvio, per non pagare il costo
+    di compilazione durante il polling."""
+    if HAVE_NUMBA:
+        dummy = make_ring([(0.0, 0.0), (0.0, 1.0), (1.0, 1.0)])
+        _wn_ring(0.5, 0.5, dummy[1], dummy[2])
+        csr = pack_polygons_csr([[dummy]])
+        _batch_pip_kernel(np.zeros(1), np.zeros(1), *csr, np.zeros(1, dtype=np.bool_))
+
+def point_in_ring(point: Tuple[float, float], ring: Ring) -> bool:
     x, y = point[1], point[0]  # (lon, lat) -> (x, y)
-    inside = False
-    n = len(ring)
-    for i in range(n):
-        yi, xi = ring[i][0], ring[i][1]
-        yj, xj = ring[(i + 1) % n][0], ring[(i + 1) % n][1]
-        if ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi + 1e-12) + xi):
-            inside = not inside
-    return inside
+    bbox, lats, lons = ring[0], ring[1], ring[2]
+    # Early-reject: 4 confronti sulla bbox evitano il loop sui lati
+    # per i punti lontani (la maggioranza sui dump dei tile).
+    if not (bbox[0] <= y <= bbox[1] and bbox[2] <= x <= bbox[3]):
+        return False
+    return bool(_wn_ring(y, x, lats, lons))
 
-def point_in_polygon(point: Tuple[float, float], polygon: List[List[Tuple[float, float]]]) -> bool:
+def point_in_polygon(point: Tuple[float, float], polygon: List[Ring]) -> bool:
     if not polygon:
         return False
-    exterior = polygon[0]
-    if not point_in_ring(point, exterior):
+    if not point_in_ring(point, polygon[0]):
         return False
-    for hole in polygon[1:]:
-        if point_in_ring(point, hole):
+    # 🔹 Caso comune (poligono senza buchi): niente slice né loop
+    if len(polygon) == 1:
+        return True
+    for i in range(1, len(polygon)):
+        if point_in_ring(point, polygon[i]):
             return False
     return True
 
-def in_any_polygon(lat: Optional[float], lon: Optional[float], polygons: Iterable[List[List[Tuple[float, float]]]]) -> bool:
+def mask_points_in_rings(pts_lat: np.ndarray, pts_lon: np.ndarray, ring: Ring) -> np.ndarray:
+    """
+    Ray-casting in batch: valuta tutti i punti contro tutti i lati
+    dell'anello via broadcasting (N,1) x (E,). Ritorna una maschera (N,).
+    Solo i punti dentro la bbox dell'anello pagano il test sui lati.
+    """
+    bbox = ring[0]
+    out = np.zeros(pts_lat.shape[0], dtype=bool)
+    cand = ((pts_lat >= bbox[0]) & (pts_lat <= bbox[1]) &
+            (pts_lon >= bbox[2]) & (pts_lon <= bbox[3]))
+    if not cand.any():
+        return out
+    y = pts_lat[cand][:, None]
+    x = pts_lon[cand][:, None]
+    yi, yj, xi, dy, dx = ring[3]   # array per-lato precalcolati al load
+    # Test incrociato senza divisione (e senza fudge 1e-12): il segno di
+    # (x-xi)*dy - dx*(y-yi) confrontato col segno di dy equivale a
+    # x < xi + dx*(y-yi)/dy; i lati orizzontali (dy==0) cadono già con cond.
+    cond = (yi > y) != (yj > y)
+    lhs = (x - xi) * dy - dx * (y - yi)
+    out[cand] = np.bitwise_xor.reduce(cond & ((lhs < 0) == (dy > 0)), axis=1)
+    return out
+
+def _triangulate_ring(lats: np.ndarray, lons: np.ndarray) -> Optional[List[Tuple[int, int, int]]]:
+    """
+    Ear-clipping O(n²) puro Python, eseguito una sola volta al load: i
+    poligoni NTTR sono statici e piccoli, il costo è ammortizzato per
+    sempre. Ritorna gli indici dei triangoli o None se la clip fallisce
+    (anello degenere/auto-intersecante).
+    """
+    n = len(lats) - 1   # l'anello è chiuso: ultimo vertice = primo
+    if n < 3:
+        return None
+    # area firmata: garantisce ordine antiorario
+    area = float(np.sum(lons[:-1] * lats[1:] - lons[1:] * lats[:-1]))
+    idx = list(range(n)) if area > 0 else list(range(n - 1, -1, -1))
+
+    def cross(a: int, b: int, c: int) -> float:
+        return ((lons[b] - lons[a]) * (lats[c] - lats[a]) -
+                (lons[c] - lons[a]) * (lats[b] - lats[a]))
+
+    def in_tri(p: int, a: int, b: int, c: int) -> bool:
+        d1 = cross(a, b, p)
+        d2 = cross(b, c, p)
+        d3 = cross(c, a, p)
+        return d1 >= 0 and d2 >= 0 and d3 >= 0
+
+    tris: List[Tuple[int, int, int]] = []
+    guard = 0
+    while len(idx) > 3 and guard < n * n:
+        guard += 1
+        for k in range(len(idx)):
+            a, b, c = idx[k - 1], idx[k], idx[(k + 1) % len(idx)]
+            if cross(a, b, c) <= 0:      # vertice riflesso: non è un orecchio
+                continue
+            if any(in_tri(p, a, b, c) for p in idx if p not in (a, b, c)):
+                continue
+            tris.append((a, b, c))
+            del idx[k]
+            break
+        else:
+            return None   # nessun orecchio trovato: anello non semplice
+    if len(idx) == 3:
+        tris.append((idx[0], idx[1], idx[2]))
+    return tris if guard < n * n else None
+
+def triangulate_polygons(polygons: List[List[Ring]]) -> List[Optional[Tuple[np.ndarray, np.ndarray]]]:
+    """Per ogni poligono senza buchi, pre-triangola l'anello esterno in un
+    ventaglio (T,3) di coordinate: il PIP diventa 3 test di segno per
+    triangolo, branchless e vettorizzabile. None dove non applicabile."""
+    fans: List[Optional[Tuple[np.ndarray, np.ndarray]]] = []
+    for poly in polygons:
+        if len(poly) != 1:          # i buchi restano sul percorso ray-cast
+            fans.append(None)
+            continue
+        lats, lons = poly[0][1], poly[0][2]
+        tris = _triangulate_ring(lats, lons)
+        if not tris:
+            fans.append(None)
+            continue
+        t = np.array(tris)
+        fans.append((lats[t], lons[t]))
+    return fans
+
+def mask_points_in_tris(pts_lat: np.ndarray, pts_lon: np.ndarray,
+                        tri_lat: np.ndarray, tri_lon: np.ndarray) -> np.ndarray:
+    """Test punto-in-ventaglio vettorizzato: un punto è dentro se i tre
+    prodotti vettoriali di un triangolo hanno tutti lo stesso segno."""
+    y = pts_lat[:, None]
+    x = pts_lon[:, None]
+    d1 = (x - tri_lon[:, 1]) * (tri_lat[:, 0] - tri_lat[:, 1]) - \
+         (tri_lon[:, 0] - tri_lon[:, 1]) * (y - tri_lat[:, 1])
+    d2 = (x - tri_lon[:, 2]) * (tri_lat[:, 1] - tri_lat[:, 2]) - \
+         (tri_lon[:, 1] - tri_lon[:, 2]) * (y - tri_lat[:, 2])
+    d3 = (x - tri_lon[:, 0]) * (tri_lat[:, 2] - tri_lat[:, 0]) - \
+         (tri_lon[:, 2] - tri_lon[:, 0]) * (y - tri_lat[:, 0])
+    has_neg = (d1 < 0) | (d2 < 0) | (d3 < 0)
+    has_pos = (d1 > 0) | (d2 > 0) | (d3 > 0)
+    return np.any(~(has_neg & has_pos), axis=1)
+
+# Risoluzione della griglia di accelerazione raster (per lato).
+GRID_SIZE = 128
+
+def build_polygon_grids(polygons: List[List[Ring]]) -> List[Optional[tuple]]:
+    """
+    Griglia raster di accelerazione per poligono (stile ESRI): ogni cella
+    della bbox è classificata 0=fuori, 1=dentro, 2=mista. Il caso comune
+    (punto ben fuori o ben dentro) si risolve con due load; solo le celle
+    miste ricadono sul test esatto. Costruita una volta al load, i
+    poligoni sono statici per tutta la vita del processo.
+    """
+    grids: List[Optional[tuple]] = []
+    for poly in polygons:
+        bbox = poly[0][0]
+        dlat = (bbox[1] - bbox[0]) / GRID_SIZE
+        dlon = (bbox[3] - bbox[2]) / GRID_SIZE
+        if dlat <= 0 or dlon <= 0:
+            grids.append(None)
+            continue
+        grid = np.full((GRID_SIZE, GRID_SIZE), 255, dtype=np.uint8)   # 255 = da classificare
+        # 1) celle attraversate da un lato -> miste; campiona ogni lato a
+        # passo mezza cella e dilata 3x3 per coprire gli sliver d'angolo
+        for ring in poly:
+            lats, lons = ring[1], ring[2]
+            for i in range(len(lats) - 1):
+                seg = max(abs(lats[i + 1] - lats[i]) / dlat, abs(lons[i + 1] - lons[i]) / dlon)
+                steps = int(seg * 2) + 2
+                t = np.linspace(0.0, 1.0, steps)
+                iy = ((lats[i] + (lats[i + 1] - lats[i]) * t - bbox[0]) / dlat).astype(np.int64)
+                ix = ((lons[i] + (lons[i + 1] - lons[i]) * t - bbox[2]) / dlon).astype(np.int64)
+                for oy in (-1, 0, 1):
+                    for ox in (-1, 0, 1):
+                        yy = np.clip(iy + oy, 0, GRID_SIZE - 1)
+                        xx = np.clip(ix + ox, 0, GRID_SIZE - 1)
+                        grid[yy, xx] = 2
+        # 2) celle rimanenti: classificate col test esatto sul centro
+        uy, ux = np.nonzero(grid == 255)
+        if uy.size:
+            c_lat = bbox[0] + (uy + 0.5) * dlat
+            c_lon = bbox[2] + (ux + 0.5) * dlon
+            inside = points_in_any_polygon(c_lat, c_lon, [poly])
+            grid[uy, ux] = inside.astype(np.uint8)
+        grids.append((bbox, dlat, dlon, grid))
+    return grids
+
+def polygon_bboxes(polygons: List[List[Ring]]) -> np.ndarray:
+    """Indice spaziale minimale: array (P, 4) con le bbox degli anelli
+    esterni, interrogabile in un solo passaggio vettoriale."""
+    if not polygons:
+        return np.zeros((0, 4), dtype=np.float64)
+    return np.array([poly[0][0] for poly in polygons], dtype=np.float64)
+
+def prepare_shapely_polygons(polygons: List[List[Ring]]) -> Optional[list]:
+    """Se shapely 2.x è disponibile, converte i poligoni in geometrie GEOS
+    preparate (indice interno per-geometria): contains_xy su array salta
+    del tutto l'allocazione dei Point. Ritorna None senza shapely."""
+    if not HAVE_SHAPELY:
+        return None
+    out = []
+    for poly in polygons:
+        shell = list(zip(poly[0][2], poly[0][1]))           # (lon, lat) -> (x, y)
+        holes = [list(zip(h[2], h[1])) for h in poly[1:]]
+        p = shapely.Polygon(shell, holes)
+        shapely.prepare(p)
+        out.append(p)
+    return out
+
+def mask_in_any_bbox(pts_lat: np.ndarray, pts_lon: np.ndarray, bboxes: np.ndarray) -> np.ndarray:
+    """Maschera (N,): True se il punto cade in almeno una bbox dell'indice."""
+    la = pts_lat[None, :]
+    lo = pts_lon[None, :]
+    return np.any((bboxes[:, 0:1] <= la) & (la <= bboxes[:, 1:2]) &
+                  (bboxes[:, 2:3] <= lo) & (lo <= bboxes[:, 3:4]), axis=0)
+
+def points_in_any_polygon(pts_lat: np.ndarray, pts_lon: np.ndarray,
+                          polygons: List[List[Ring]],
+                          bboxes: Optional[np.ndarray] = None,
+                          shp_polys: Optional[list] = None,
+                          tri_fans: Optional[list] = None,
+                          csr=None,
+                          grids: Optional[list] = None) -> np.ndarray:
+    """Maschera booleana (N,): True se il punto cade in almeno un poligono
+    (dentro l'anello esterno e fuori da eventuali buchi)."""
+    inside = np.zeros(pts_lat.shape[0], dtype=bool)
+    if shp_polys is not None:
+        # Percorso GEOS preparato: un contains_xy vettoriale per poligono.
+        for p in shp_polys:
+            inside |= shapely.contains_xy(p, pts_lon, pts_lat)
+        return inside
+    if csr is not None and HAVE_NUMBA:
+        # Kernel nativo multi-core sull'intero batch (layout CSR).
+        _batch_pip_kernel(pts_lat, pts_lon, *csr, inside)
+        return inside
+    if bboxes is None:
+        bboxes = polygon_bboxes(polygons)
+    # Query vettoriale sull'indice bbox: solo i poligoni con almeno un
+    # punto candidato pagano il test esatto.
+    la = pts_lat[None, :]
+    lo = pts_lon[None, :]
+    cand_poly = np.any((bboxes[:, 0:1] <= la) & (la <= bboxes[:, 1:2]) &
+                       (bboxes[:, 2:3] <= lo) & (lo <= bboxes[:, 3:4]), axis=1)
+    for p in np.nonzero(cand_poly)[0]:
+        poly = polygons[p]
+        if grids is not None and grids[p] is not None:
+            # Griglia raster: dentro/fuori in O(1), test esatto solo
+            # per i punti caduti in celle miste.
+            gb, dlat, dlon, grid = grids[p]
+            cand = ((pts_lat >= gb[0]) & (pts_lat <= gb[1]) &
+                    (pts_lon >= gb[2]) & (pts_lon <= gb[3]))
+            sub = np.nonzero(cand)[0]
+            if sub.size:
+                iy = np.clip(((pts_lat[sub] - gb[0]) / dlat).astype(np.int64), 0, GRID_SIZE - 1)
+                ix = np.clip(((pts_lon[sub] - gb[2]) / dlon).astype(np.int64), 0, GRID_SIZE - 1)
+                cls = grid[iy, ix]
+                inside[sub[cls == 1]] = True
+                mixed = sub[cls == 2]
+                if mixed.size:
+                    mm = mask_points_in_rings(pts_lat[mixed], pts_lon[mixed], poly[0])
+                    if len(poly) > 1:
+                        for hole in poly[1:]:
+                            if not mm.any():
+                                break
+                            mm &= ~mask_points_in_rings(pts_lat[mixed], pts_lon[mixed], hole)
+                    inside[mixed] |= mm
+            continue
+        if tri_fans is not None and tri_fans[p] is not None:
+            # Ventaglio pre-triangolato: 3 test di segno per triangolo
+            bbox = poly[0][0]
+            cand = ((pts_lat >= bbox[0]) & (pts_lat <= bbox[1]) &
+                    (pts_lon >= bbox[2]) & (pts_lon <= bbox[3]))
+            if cand.any():
+                tri_lat, tri_lon = tri_fans[p]
+                m = np.zeros(pts_lat.shape[0], dtype=bool)
+                m[cand] = mask_points_in_tris(pts_lat[cand], pts_lon[cand], tri_lat, tri_lon)
+                inside |= m
+            continue
+        m = mask_points_in_rings(pts_lat, pts_lon, poly[0])
+        if len(poly) > 1:
+            for hole in poly[1:]:
+                if not m.any():
+                    break
+                m &= ~mask_points_in_rings(pts_lat, pts_lon, hole)
+        inside |= m
+    return inside
+
+def in_any_polygon(lat: Optional[float], lon: Optional[float], polygons: List[List[Ring]],
+                   bboxes: Optional[np.ndarray] = None) -> bool:
     if lat is None or lon is None:
         return False
     pt = (lat, lon)
+    if bboxes is not None:
+        cand = np.nonzero((bboxes[:, 0] <= lat) & (lat <= bboxes[:, 1]) &
+                          (bboxes[:, 2] <= lon) & (lon <= bboxes[:, 3]))[0]
+        return any(point_in_polygon(pt, polygons[i]) for i in cand)
     for poly in polygons:
         if point_in_polygon(pt, poly):
             return True
     return False
 
+def _ring_is_rect(ring: Ring) -> bool:
+    """True se l'anello è un rettangolo allineato agli assi (4 lati, ognuno
+    orizzontale o verticale): il test bbox È il test esatto di contenimento."""
+    lats, lons = ring[1], ring[2]
+    if lats.shape[0] != 5:   # 4 vertici + chiusura
+        return False
+    _, _, _, dy, dx = ring[3]
+    # ogni lato ha esattamente una coordinata costante (niente diagonali
+    # né lati degeneri) e i vertici usano solo 2 lat e 2 lon distinte
+    return (bool(np.all((dy == 0.0) != (dx == 0.0)))
+            and np.unique(lats).size == 2 and np.unique(lons).size == 2)
+
+def make_zone_filter(polygons: List[List[Ring]]):
+    """🔹 Specializza il filtro geografico sui poligoni caricati: costruisce
+    una volta tutte le strutture di accelerazione (indice bbox, geometrie
+    GEOS, ventagli, layout CSR, griglie raster) e le cattura in una closure
+    `filter_points(lats, lons) -> mask`. Il loop di polling vede una sola
+    funzione già legata ai suoi dati, senza lookup né parametri per poll.
+
+    I poligoni rettangolari senza buchi (come quelli di esempio) vengono
+    separati a monte: per loro basta la maschera bbox, 4 confronti esatti."""
+    rect_polys = [p for p in polygons if len(p) == 1 and _ring_is_rect(p[0])]
+    gen_polys = [p for p in polygons if not (len(p) == 1 and _ring_is_rect(p[0]))]
+    rect_bboxes = polygon_bboxes(rect_polys) if rect_polys else None
+    if rect_polys:
+        print(f"[INFO] Poligoni rettangolari: {len(rect_polys)} (test bbox esatto)")
+
+    bboxes = polygon_bboxes(gen_polys)
+    shp_polys = prepare_shapely_polygons(gen_polys)
+    tri_fans = triangulate_polygons(gen_polys)
+    csr = pack_polygons_csr(gen_polys) if HAVE_NUMBA else None
+    grids = build_polygon_grids(gen_polys)
+    if shp_polys is not None:
+        print("[INFO] shapely disponibile: filtro poligoni via geometrie preparate GEOS")
+
+    def filter_points(pts_lat: np.ndarray, pts_lon: np.ndarray) -> np.ndarray:
+        if rect_bboxes is not None:
+            inside = mask_in_any_bbox(pts_lat, pts_lon, rect_bboxes)
+            if gen_polys:
+                inside |= points_in_any_polygon(pts_lat, pts_lon, gen_polys, bboxes,
+                                                shp_polys, tri_fans, csr, grids)
+            return inside
+        return points_in_any_polygon(pts_lat, pts_lon, gen_polys, bboxes,
+                                     shp_polys, tri_fans, csr, grids)
+
+    return filter_points
+
 # ---------------------------
 # Utility: load polygons
 # ---------------------------
-def load_polygons_from_geojson(path: str) -> List[List[List[Tuple[float, float]]]]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def _polygons_cache_path(path: str, raw: bytes) -> str:
+    h = hashlib.sha1(raw).hexdigest()[:12]
+    return f"{path}.{h}.npz"
+
+def _save_polygons_npz(cache: str, polys: List[List[Ring]]) -> None:
+    arrays = {}
+    for i, poly in enumerate(polys):
+        for j, ring in enumerate(poly):
+            arrays[f"p{i}_r{j}_lat"] = ring[1]
+            arrays[f"p{i}_r{j}_lon"] = ring[2]
+    np.savez(cache, **arrays)
+
+def _load_polygons_npz(cache: str) -> List[List[Ring]]:
+    polys: List[List[Ring]] = []
+    with np.load(cache) as data:
+        i = 0
+        while f"p{i}_r0_lat" in data:
+            rings: List[Ring] = []
+            j = 0
+            while f"p{i}_r{j}_lat" in data:
+                rings.append(_finish_ring(data[f"p{i}_r{j}_lat"], data[f"p{i}_r{j}_lon"]))
+                j += 1
+            polys.append(rings)
+            i += 1
+    return polys
+
+def load_polygons_from_geojson(path: str) -> List[List[Ring]]:
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    # 🔹 Cache .npz degli array compilati, chiave = hash del sorgente:
+    # i riavvii con lo stesso file saltano il parse GeoJSON.
+    cache = _polygons_cache_path(path, raw)
+    if os.path.isfile(cache):
+        try:
+            return _load_polygons_npz(cache)
+        except Exception as e:
+            print(f"[WARN] Cache poligoni illeggibile ({cache}): {e}", file=sys.stderr)
+
+    data = json.loads(raw)
 
     polys = []
     if isinstance(data, dict) and data.get("type") == "FeatureCollection":
@@ -148,25 +669,30 @@ def load_polygons_from_geojson(path: str) -> List[List[List[Tuple[float, float]]
             if gtype == "Polygon":
                 rings = []
                 for ring in coords:
-                    rings.append([(float(pt[1]), float(pt[0])) for pt in ring])
+                    rings.append(make_ring([(float(pt[1]), float(pt[0])) for pt in ring]))
                 polys.append(rings)
             elif gtype == "MultiPolygon":
                 for polycoords in coords:
                     rings = []
                     for ring in polycoords:
-                        rings.append([(float(pt[1]), float(pt[0])) for pt in ring])
+                        rings.append(make_ring([(float(pt[1]), float(pt[0])) for pt in ring]))
                     polys.append(rings)
     elif isinstance(data, dict) and "polygons" in data:
         for poly in data["polygons"]:
             rings = []
             for ring in poly:
-                rings.append([(float(pt[0]), float(pt[1])) for pt in ring])
+                rings.append(make_ring([(float(pt[0]), float(pt[1])) for pt in ring]))
             polys.append(rings)
     else:
         raise ValueError("Formato GeoJSON/JSON non riconosciuto")
+
+    try:
+        _save_polygons_npz(cache, polys)
+    except Exception as e:
+        print(f"[WARN] Scrittura cache poligoni fallita: {e}", file=sys.stderr)
     return polys
 
-def sample_approx_polygons() -> List[List[List[Tuple[float, float]]]]:
+def sample_approx_polygons() -> List[List[Ring]]:
     boxes = [
         (37.05, 37.55, -116.15, -115.30),
         (37.55, 38.10, -117.20, -116.30),
@@ -182,64 +708,128 @@ def sample_approx_polygons() -> List[List[List[Tuple[float, float]]]]:
             (max_lat, min_lon),
             (min_lat, min_lon)
         ]
-        polys.append([ring])
+        polys.append([make_ring(ring)])
     return polys
 
 # ---------------------------
 # Fetching / parsing aircraft
 # ---------------------------
+# 🔹 Cache condizionale per tile: url -> (etag, last_modified, ultimo risultato).
+# Su 304 Not Modified si riusa il parse precedente (zero banda, zero decode).
+_TILE_CACHE: Dict[str, Tuple[Optional[str], Optional[str], List[dict]]] = {}
+
+def _backoff_delay(attempt: int, response=None) -> float:
+    """Ritardo prima del retry: onora Retry-After (secondi o data HTTP) se
+    il server lo manda, altrimenti backoff esponenziale con jitter per non
+    sincronizzare i retry tra istanze riavviate insieme."""
+    if response is not None:
+        ra = response.headers.get("Retry-After")
+        if ra:
+            try:
+                return max(0.0, float(ra))
+            except ValueError:
+                try:
+                    when = parsedate_to_datetime(ra)
+                    return max(0.0, (when - dt.datetime.now(dt.timezone.utc)).total_seconds())
+                except Exception:
+                    pass
+    return HTTP_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
 def fetch_tile(lat: float, lon: float, rng_nm: int) -> List[dict]:
     api_rate_guard()   # 🔹 qui la guardia globale
     url = API_TEMPLATE.format(lat=lat, lon=lon, rng=rng_nm)
+    cached = _TILE_CACHE.get(url)
+    headers = {}
+    if cached:
+        if cached[0]:
+            headers["If-None-Match"] = cached[0]
+        if cached[1]:
+            headers["If-Modified-Since"] = cached[1]
     last_exc = None
     # 1 tentativo iniziale + HTTP_RETRIES retry
     for attempt in range(HTTP_RETRIES + 1):
         try:
-            r = requests.get(url, timeout=HTTP_TIMEOUT)
+            r = SESSION.get(url, timeout=HTTP_TIMEOUT, headers=headers)
+            if r.status_code == 304 and cached:
+                return cached[2]
+            if r.status_code in (429, 503) and attempt < HTTP_RETRIES:
+                time.sleep(_backoff_delay(attempt, r))
+                continue
             r.raise_for_status()
-            j = r.json()
-            return j.get("aircraft", []) or []
+            # r.content evita il giro di ri-decodifica unicode di r.json()
+            j = _json_loads(r.content)
+            acs = j.get("aircraft", []) or []
+            _TILE_CACHE[url] = (r.headers.get("ETag"), r.headers.get("Last-Modified"), acs)
+            return acs
         except Exception as e:
             last_exc = e
             if attempt < HTTP_RETRIES:
-                time.sleep(HTTP_BACKOFF * (attempt + 1))
+                time.sleep(_backoff_delay(attempt))
     print(f"[WARN] Fetch fallito {url} — {last_exc}", file=sys.stderr)
     return []
 
 def fetch_all_tiles() -> List[dict]:
+    # Fetch dei tile in parallelo: il rate-guard scagliona le partenze,
+    # ma le risposte HTTP si sovrappongono (wall time ≈ max, non somma).
+    with ThreadPoolExecutor(max_workers=len(TILES)) as ex:
+        results = list(ex.map(lambda t: fetch_tile(*t), TILES))
     seen = set()
     merged: List[dict] = []
-    for (lat, lon, rng) in TILES:
-        acs = fetch_tile(lat, lon, rng)
-        for ac in acs:
-            hx = (ac.get("hex") or "").lower()
+    # alias locali: evita il lookup d'attributo per elemento nel merge
+    seen_add = seen.add
+    merged_append = merged.append
+    for acs in results:
+        for hx, ac in (((a.get("hex") or "").lower(), a) for a in acs):
             if hx and hx not in seen:
-                seen.add(hx)
-                merged.append(ac)
+                seen_add(hx)
+                merged_append(ac)
     return merged
 
-def to_aircraft(ac: dict) -> Aircraft:
-    def safe_int(val):
+# 🔹 Coercizioni a livello modulo (non ridefinite a ogni chiamata) e senza
+# try/except sul percorso comune: i campi assenti arrivano come None e il
+# sollevamento dell'eccezione costava più del parsing stesso.
+def safe_float(val) -> Optional[float]:
+    t = type(val)
+    if t is float:
+        return val
+    if t is int:
+        return float(val)
+    if t is str:
         try:
-            return int(val)
-        except (TypeError, ValueError):
+            return float(val)
+        except ValueError:
             return None
-
-    def safe_float(val):
+    return None   # None o tipo inatteso
+
+def safe_int(val) -> Optional[int]:
+    t = type(val)
+    if t is int:
+        return val
+    if t is float:
+        return int(val)
+    if t is str:
         try:
-            return float(val)
-        except (TypeError, ValueError):
+            return int(val)
+        except ValueError:
             return None
+    return None
+
+def to_aircraft(ac: dict) -> Aircraft:
+    # 🔹 sys.intern sulle stringhe corte che si ripetono a ogni poll
+    # (hex/flight/reg/sigla): stesso oggetto riusato, e i confronti di
+    # chiave nei dict per-hex diventano confronti di identità
+    reg = (ac.get("r") or ac.get("reg") or "").strip()
+    model_t = (ac.get("t") or "").strip()
     return Aircraft(
-        hex=(ac.get("hex") or "").lower(),
-        flight=(ac.get("flight") or "").strip(),
+        hex=sys.intern((ac.get("hex") or "").lower()),
+        flight=sys.intern((ac.get("flight") or "").strip()),
         lat=safe_float(ac.get("lat")),
         lon=safe_float(ac.get("lon")),
         alt_baro=safe_int(ac.get("alt_baro")),
         gs=safe_float(ac.get("gs")),
         ts=safe_float(ac.get("seen_pos_timestamp") or ac.get("seen_timestamp")),
-        reg=(ac.get("r") or ac.get("reg") or "").strip() or None,
-        model_t=(ac.get("t") or "").strip() or None,        # 🔹 sigla
+        reg=sys.intern(reg) if reg else None,
+        model_t=sys.intern(model_t) if model_t else None,   # 🔹 sigla
         model_desc=(ac.get("desc") or "").strip() or None ,  # 🔹 esteso
         is_mil=bool(
             ac.get("force_mil") or
@@ -250,6 +840,37 @@ def to_aircraft(ac: dict) -> Aircraft:
         )
     )
 
+# 🔹 Cache di parsing: {hex: (timestamp posizione, Aircraft)}. Se il feed
+# restituisce lo stesso aereo con lo stesso timestamp, il dataclass del
+# poll precedente viene riusato senza ripassare dai safe_float/safe_int.
+_AC_CACHE: Dict[str, Tuple[float, Aircraft]] = {}
+_AC_CACHE_MAX = 4096   # tetto: oltre, si tengono solo gli hex del batch
+
+def parse_aircraft(raw: List[dict]) -> List[Aircraft]:
+    """Converte i dict grezzi in Aircraft riusando la cache per i contatti
+    il cui timestamp di posizione non è cambiato dall'ultimo poll."""
+    out: List[Aircraft] = []
+    for ac in raw:
+        hx = ac.get("hex")
+        ts = ac.get("seen_pos_timestamp") or ac.get("seen_timestamp")
+        # force_mil è un marcatore aggiunto da fetch_military, non parte del
+        # payload: quei dict non passano dalla cache per non perdere il flag
+        if not hx or ts is None or ac.get("force_mil"):
+            out.append(to_aircraft(ac))
+            continue
+        hit = _AC_CACHE.get(hx)
+        if hit is not None and hit[0] == ts:
+            out.append(hit[1])
+        else:
+            parsed = to_aircraft(ac)
+            _AC_CACHE[hx] = (ts, parsed)
+            out.append(parsed)
+    if len(_AC_CACHE) > _AC_CACHE_MAX:
+        live = {ac.get("hex") for ac in raw}
+        for k in [k for k in _AC_CACHE if k not in live]:
+            del _AC_CACHE[k]
+    return out
+
 # ---------------------------
 # fetch military
 # ---------------------------
@@ -258,9 +879,9 @@ def fetch_military() -> List[dict]:
     last_exc = None
     for attempt in range(HTTP_RETRIES + 1):
         try:
-            r = requests.get(API_MIL, timeout=HTTP_TIMEOUT)
+            r = SESSION.get(API_MIL, timeout=HTTP_TIMEOUT)
             r.raise_for_status()
-            raw = r.json() or {}
+            raw = _json_loads(r.content) or {}
             if isinstance(raw, dict) and "ac" in raw:
                 data = raw["ac"]
             elif isinstance(raw, list):
@@ -296,19 +917,32 @@ def load_hex_filters(path: Optional[str]) -> List[str]:
             pats.append(s.lower())
     return pats
 
-def match_hex(hex_code: str, patterns: List[str]) -> bool:
+HexFilter = Tuple[FrozenSet[str], Optional[re.Pattern]]
+
+def compile_hex_filters(pats: List[str]) -> Optional[HexFilter]:
+    """
+    🔹 Separa i pattern letterali (senza metacaratteri) dai wildcard:
+    i letterali finiscono in un frozenset (lookup O(1)), i wildcard in
+    un'unica regex (alternazione) — un solo match per aereo invece di
+    una fnmatch per pattern.
+    """
+    if not pats:
+        return None
+    literals = frozenset(p for p in pats if not any(c in p for c in "*?["))
+    wild = [p for p in pats if p not in literals]
+    wild_re = re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in wild)) if wild else None
+    return literals, wild_re
+
+def match_hex(hex_code: str, hex_filter: Optional[HexFilter]) -> bool:
+    if hex_filter is None:
+        return False
+    literals, wild_re = hex_filter
     hx = hex_code.lower()
-    for pat in patterns:
-        if fnmatch.fnmatch(hx, pat):
-            return True
-    return False
+    return hx in literals or (wild_re is not None and wild_re.match(hx) is not None)
 
-def send_telegram(text: str) -> None:
+def _telegram_post(text: str) -> None:
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     chat_id = os.getenv("TELEGRAM_CHAT_ID")
-    if not token or not chat_id:
-        print("[INFO] Telegram non configurato (manca TELEGRAM_BOT_TOKEN o TELEGRAM_CHAT_ID).")
-        return
     url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {
         "chat_id": chat_id,
@@ -317,42 +951,143 @@ def send_telegram(text: str) -> None:
         "parse_mode": "Markdown"
     }
     try:
-        r = requests.post(url, json=payload, timeout=10)
+        # 🔹 SESSION condivisa: riusa la connessione TLS verso api.telegram.org
+        r = SESSION.post(url, json=payload, timeout=10)
         if r.status_code != 200:
             print(f"[WARN] Telegram HTTP {r.status_code}: {r.text}", file=sys.stderr)
     except Exception as e:
         print(f"[WARN] Telegram errore: {e}", file=sys.stderr)
 
-def load_seen_csv(csv_path: str) -> Dict[str, dict]:
-    seen: Dict[str, dict] = {}
-    if not csv_path or not os.path.isfile(csv_path):
+# 🔹 Invio Telegram in background: il loop di polling accoda e basta, il
+# round-trip HTTP (100-500 ms a messaggio) non consuma il budget del poll.
+_TG_QUEUE: "queue.Queue[str]" = queue.Queue()
+_TG_THREAD: Optional[threading.Thread] = None
+_TG_MAX_LEN = 4096   # limite Telegram per messaggio
+
+def _tg_worker() -> None:
+    while True:
+        batch = [_TG_QUEUE.get()]
+        try:
+            while True:
+                batch.append(_TG_QUEUE.get_nowait())
+        except queue.Empty:
+            pass
+        # Coalesce: più notifiche nello stesso giro diventano un solo
+        # sendMessage, finché si resta sotto il limite di 4096 caratteri
+        cur = ""
+        for msg in batch:
+            if cur and len(cur) + 2 + len(msg) <= _TG_MAX_LEN:
+                cur += "\n\n" + msg
+            else:
+                if cur:
+                    _telegram_post(cur)
+                cur = msg[:_TG_MAX_LEN]
+        if cur:
+            _telegram_post(cur)
+
+def send_telegram(text: str) -> None:
+    if not os.getenv("TELEGRAM_BOT_TOKEN") or not os.getenv("TELEGRAM_CHAT_ID"):
+        print("[INFO] Telegram non configurato (manca TELEGRAM_BOT_TOKEN o TELEGRAM_CHAT_ID).")
+        return
+    global _TG_THREAD
+    if _TG_THREAD is None:
+        _TG_THREAD = threading.Thread(target=_tg_worker, daemon=True)
+        _TG_THREAD.start()
+    _TG_QUEUE.put(text)
+
+def _hex_sidecar_path(csv_path: str) -> str:
+    """File sidecar accanto al CSV (es. contacts.hex): un hex per riga."""
+    return os.path.splitext(csv_path)[0] + ".hex"
+
+def load_seen_hex(csv_path: str) -> Set[str]:
+    """Carica solo la colonna hex dal CSV: per la dedup serve l'appartenenza,
+    non l'intera riga (memoria O(hex) invece di O(righe complete)).
+
+    🔹 Se esiste il sidecar .hex lo usa al posto del CSV (niente parsing
+    dello storico a ogni avvio); altrimenti lo materializza dal CSV."""
+    seen: Set[str] = set()
+    if not csv_path:
+        return seen
+    sidecar = _hex_sidecar_path(csv_path)
+    if os.path.isfile(sidecar):
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                seen.update(hx for hx in (line.strip().lower() for line in f) if hx)
+            return seen
+        except Exception as e:
+            print(f"[WARN] Lettura sidecar hex fallita, rileggo il CSV: {e}", file=sys.stderr)
+            seen.clear()
+    if not os.path.isfile(csv_path):
         return seen
     try:
-        with open(csv_path, "r", newline="", encoding="utf-8") as f:
-            rd = csv.DictReader(f)
-            for row in rd:
-                hx = (row.get("hex") or "").lower()
-                if hx:
-                    seen[hx] = row
+        with open(csv_path, "r", encoding="utf-8") as f:
+            header = f.readline()
+            if not header:
+                return seen
+            try:
+                hex_idx = next(csv.reader([header])).index("hex")
+            except ValueError:
+                print(f"[WARN] Colonna 'hex' assente in {csv_path}", file=sys.stderr)
+                return seen
+            # Split diretto invece di DictReader: la colonna hex precede i
+            # campi a testo libero, quindi nessuna virgola quotata prima.
+            for line in f:
+                parts = line.split(",", hex_idx + 1)
+                if len(parts) > hex_idx:
+                    hx = parts[hex_idx].strip().lower()
+                    if hx:
+                        seen.add(hx)
     except Exception as e:
         print(f"[WARN] Lettura CSV fallita: {e}", file=sys.stderr)
-    return seen
-
-def append_seen_csv(csv_path: str, rows: List[dict]) -> None:
-    must_write_header = not os.path.isfile(csv_path)
-    fieldnames = ["first_seen_utc", "hex", "callsign", "reg", "model_t", "lat", "lon", "alt_ft", "gs_kt", "note"]
+        return seen
+    # Materializza il sidecar: i prossimi avvii saltano il parsing del CSV
     try:
-        with open(csv_path, "a", newline="", encoding="utf-8") as f:
-            wr = csv.DictWriter(f, fieldnames=fieldnames)
-            if must_write_header:
-                wr.writeheader()
-            for r in rows:
-                wr.writerow(r)
+        with open(sidecar, "w", encoding="utf-8") as f:
+            f.write("".join(hx + "\n" for hx in seen))
     except Exception as e:
-        print(f"[WARN] Scrittura CSV fallita: {e}", file=sys.stderr)
+        print(f"[WARN] Scrittura sidecar hex fallita: {e}", file=sys.stderr)
+    return seen
+
+CSV_FIELDS = ["first_seen_utc", "hex", "callsign", "reg", "model_t", "lat", "lon", "alt_ft", "gs_kt", "note"]
+
+def open_seen_csv(csv_path: str):
+    """Apre il CSV in append una sola volta per la vita del processo
+    (niente open/close per ogni poll); scrive l'header se il file è nuovo.
+    Ritorna (file, writer)."""
+    must_write_header = not os.path.isfile(csv_path) or os.path.getsize(csv_path) == 0
+    f = open(csv_path, "a", newline="", encoding="utf-8")
+    # csv.writer su tuple già ordinate: niente lookup dict per campo per riga
+    wr = csv.writer(f)
+    if must_write_header:
+        wr.writerow(CSV_FIELDS)
+        f.flush()
+    return f, wr
+
+def open_hex_sidecar(csv_path: str):
+    """Apre il sidecar .hex in append, una sola volta per la vita del
+    processo (come il CSV)."""
+    return open(_hex_sidecar_path(csv_path), "a", encoding="utf-8")
+
+def csv_row(ac: Aircraft, now_str: str, note: str) -> tuple:
+    """Riga CSV per un contatto, come tupla nell'ordine di CSV_FIELDS;
+    i float vengono formattati solo qui, cioè solo quando la riga viene
+    davvero scritta."""
+    return (
+        now_str,
+        ac.hex,
+        ac.flight or "",
+        ac.reg or "",
+        ac.model_t or "",
+        ac.lat if ac.lat is not None else "",
+        ac.lon if ac.lon is not None else "",
+        ac.alt_baro if ac.alt_baro is not None else "",
+        f"{ac.gs:.0f}" if ac.gs is not None else "",
+        note,
+    )
 
 def now_utc_str() -> str:
-    return dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    # time.strftime/gmtime: stesso output, senza allocare un datetime
+    return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime())
 
 # --------- Formattazioni output ---------
 def _fmt_latlon(lat: Optional[float], lon: Optional[float]) -> str:
@@ -399,30 +1134,66 @@ def format_ac_telegram(ac: Aircraft) -> str:
 
     return "  ".join(parts)
 
+@functools.lru_cache(maxsize=4096)
+def _links_for(hex_code: str, flight_code: str, reg_code: str) -> str:
+    """🔹 Blocco link piattaforme per le notifiche Telegram, memoizzato:
+    HEX/FLT/REG sono statici per un aereo, quindi le stesse f-string non
+    vengono ricostruite a ogni notifica dello stesso contatto."""
+    links = []
+    if hex_code:
+        links.append(f"[ADSB.fi](https://globe.adsb.fi/?icao={hex_code}): https://globe.adsb.fi/?icao={hex_code}")
+        links.append(f"[ADSB Exchange](https://globe.adsbexchange.com/?icao={hex_code}): https://globe.adsbexchange.com/?icao={hex_code}")
+        links.append(f"[Planespotters](https://www.planespotters.net/): https://www.planespotters.net/hex/{hex_code}")
+    if flight_code:
+        links.append(f"[FlightAware](https://www.flightaware.com/): https://flightaware.com/live/flight/{flight_code}")
+    if reg_code:
+        links.append(f"[AirHistory](https://www.airhistory.net/): https://www.airhistory.net/marks-all/{reg_code}")
+        links.append(f"[JetPhotos](https://www.jetphotos.com/): https://www.jetphotos.com/registration/{reg_code}")
+    return "\n".join(links)
+
 # --------- Rilevazione anomalie ---------
-def detect_anomalies(ac: Aircraft, prev: Optional[Aircraft], dt_sec: Optional[float]) -> List[str]:
-    notes = []
-    if ac.gs is not None:
-        if ac.gs > MAX_GS_KT:
-            notes.append(f"GS alta {ac.gs:.0f} kt")
-        elif ac.gs < MIN_GS_KT:
-            notes.append(f"GS bassa {ac.gs:.0f} kt")
-    if ac.alt_baro is not None:
-        if ac.alt_baro > MAX_ALT_FT:
-            notes.append(f"ALT alta {ac.alt_baro} ft")
-        elif ac.alt_baro < MIN_ALT_FT:
-            notes.append(f"ALT bassa {ac.alt_baro} ft")
-    if prev and dt_sec and dt_sec > 0:
-        if ac.gs is not None and prev.gs is not None:
-            dgs = abs(ac.gs - prev.gs)
-            if dgs > MAX_DGS_KTS:
-                notes.append(f"ΔGS anomalo +{dgs:.0f} kt")
-        if ac.alt_baro is not None and prev.alt_baro is not None:
-            dalt = ac.alt_baro - prev.alt_baro
-            vs_fpm = (dalt / dt_sec) * 60.0
-            if abs(vs_fpm) > MAX_VS_FPM:
-                notes.append(f"VS anomala {vs_fpm:.0f} fpm")
-    return notes
+def detect_anomalies_batch(aircraft: List[Aircraft], prev_state: Optional[Dict[str, np.ndarray]],
+                           dt_sec: Optional[float]) -> Tuple[Dict[str, List[str]], Dict[str, np.ndarray]]:
+    """
+    Versione colonnare (SoA) del rilevatore anomalie: le soglie vengono
+    valutate in blocco su array NumPy, le stringhe di nota sono costruite
+    solo per gli indici flaggati. Lo stato precedente è un dict di array
+    (hex, gs, alt) dell'ultimo poll; i delta ΔGS/VS si calcolano in bulk
+    allineando i due poll via np.intersect1d.
+    Ritorna (note_per_hex, stato_corrente).
+    """
+    n = len(aircraft)
+    hexes = np.array([ac.hex for ac in aircraft])
+    gs = np.fromiter((ac.gs if ac.gs is not None else np.nan for ac in aircraft),
+                     dtype=np.float64, count=n)
+    alt = np.fromiter((float(ac.alt_baro) if ac.alt_baro is not None else np.nan for ac in aircraft),
+                      dtype=np.float64, count=n)
+
+    notes: Dict[str, List[str]] = {}
+
+    def _add(i: int, msg: str) -> None:
+        notes.setdefault(aircraft[i].hex, []).append(msg)
+
+    # NaN (campo assente) non supera nessun confronto: niente branch per-aereo
+    for i in np.nonzero(gs > MAX_GS_KT)[0]:
+        _add(i, f"GS alta {gs[i]:.0f} kt")
+    for i in np.nonzero(gs < MIN_GS_KT)[0]:
+        _add(i, f"GS bassa {gs[i]:.0f} kt")
+    for i in np.nonzero(alt > MAX_ALT_FT)[0]:
+        _add(i, f"ALT alta {int(alt[i])} ft")
+    for i in np.nonzero(alt < MIN_ALT_FT)[0]:
+        _add(i, f"ALT bassa {int(alt[i])} ft")
+
+    if prev_state is not None and dt_sec and dt_sec > 0 and n:
+        _, ci, pi = np.intersect1d(hexes, prev_state["hex"], return_indices=True)
+        dgs = np.abs(gs[ci] - prev_state["gs"][pi])
+        for k in np.nonzero(dgs > MAX_DGS_KTS)[0]:
+            _add(int(ci[k]), f"ΔGS anomalo +{dgs[k]:.0f} kt")
+        vs_fpm = (alt[ci] - prev_state["alt"][pi]) / dt_sec * 60.0
+        for k in np.nonzero(np.abs(vs_fpm) > MAX_VS_FPM)[0]:
+            _add(int(ci[k]), f"VS anomala {vs_fpm[k]:.0f} fpm")
+
+    return notes, {"hex": hexes, "gs": gs, "alt": alt}
 
 # ---------------------------
 # Main loop
@@ -451,32 +1222,63 @@ def main():
         polygons = sample_approx_polygons()
         print("[INFO] Nessun --polygons-file fornito: uso poligoni esempio (approx).")
 
+    zone_filter = make_zone_filter(polygons)   # 🔹 strutture costruite una volta
+
+    warm_pip_kernel()   # 🔹 pre-compila il kernel JIT (no-op senza numba)
+
     hex_patterns = load_hex_filters(args.hex_filter_file)
+    hex_filter = compile_hex_filters(hex_patterns)
     if hex_patterns:
         print(f"[INFO] Filtri HEX caricati ({args.hex_filter_mode}): {len(hex_patterns)} pattern")
 
-    seen_csv = load_seen_csv(args.csv)
-    seen_runtime: Dict[str, Aircraft] = {}
-    last_poll_time = None
+    seen_hex = load_seen_hex(args.csv)
+    csv_file, csv_writer = open_seen_csv(args.csv)
+    hex_file = open_hex_sidecar(args.csv)
 
     print(f"Monitor aereo con poligoni — start {now_utc_str()}")
+    try:
+        run_polling(args, zone_filter, hex_filter, seen_hex, csv_file, csv_writer, hex_file)
+    finally:
+        csv_file.close()
+        hex_file.close()
+
+def run_polling(args, zone_filter, hex_filter, seen_hex, csv_file, csv_writer, hex_file) -> None:
+    """Loop di polling: fetch, filtro poligoni/HEX, anomalie, CSV, Telegram."""
+    prev_state: Optional[Dict[str, np.ndarray]] = None   # SoA dell'ultimo poll
+    last_poll_time = None
     while True:
         t0 = time.time()
         raw = fetch_all_tiles()
-        raw += fetch_military()  # 🔹 aggiunta
-
-        # Parse
-        aircraft = [to_aircraft(ac) for ac in raw]
-
-        # Poligoni
-        aircraft = [ac for ac in aircraft if in_any_polygon(ac.lat, ac.lon, polygons)]
+        # 🔹 Il feed militare si sovrappone ai tile: chi c'è già viene solo
+        # marcato force_mil (niente doppio parse/PIP), i nuovi si accodano
+        tile_idx = {(ac.get("hex") or "").lower(): ac for ac in raw if ac.get("hex")}
+        for mil in fetch_military():
+            hit = tile_idx.get((mil.get("hex") or "").lower())
+            if hit is not None:
+                hit["force_mil"] = True
+            else:
+                raw.append(mil)
+
+        # 🔹 Filtro poligoni direttamente sui dict grezzi (lat/lon sono già
+        # lì): il dataclass Aircraft viene allocato solo per chi è in zona
+        if raw:
+            raw_lat = np.fromiter((ac.get("lat") if isinstance(ac.get("lat"), (int, float)) else np.nan
+                                   for ac in raw), dtype=np.float64, count=len(raw))
+            raw_lon = np.fromiter((ac.get("lon") if isinstance(ac.get("lon"), (int, float)) else np.nan
+                                   for ac in raw), dtype=np.float64, count=len(raw))
+            in_zone = zone_filter(raw_lat, raw_lon)
+            raw = [ac for ac, ok in zip(raw, in_zone) if ok]
+
+        # Parse (solo i sopravvissuti al filtro geografico), con cache
+        # per i contatti il cui timestamp non è cambiato
+        aircraft = parse_aircraft(raw)
 
         # Filtri HEX opzionali
-        if hex_patterns:
+        if hex_filter:
             if args.hex_filter_mode == "include":
-                aircraft = [ac for ac in aircraft if match_hex(ac.hex, hex_patterns)]
+                aircraft = [ac for ac in aircraft if match_hex(ac.hex, hex_filter)]
             else:
-                aircraft = [ac for ac in aircraft if not match_hex(ac.hex, hex_patterns)]
+                aircraft = [ac for ac in aircraft if not match_hex(ac.hex, hex_filter)]
 
         by_hex: Dict[str, Aircraft] = {ac.hex: ac for ac in aircraft if ac.hex}
         now_str = now_utc_str()
@@ -485,33 +1287,21 @@ def main():
         new_rows = []
         added_this_cycle = set()  # evita doppie aggiunte nello stesso ciclo
 
-        for hx, ac in by_hex.items():
-            prev_ac = seen_runtime.get(hx)
-            dt_sec = None
-            if last_poll_time is not None:
-                dt_sec = time.time() - last_poll_time
+        dt_sec = time.time() - last_poll_time if last_poll_time is not None else None
+        anomalies_by_hex, prev_state = detect_anomalies_batch(list(by_hex.values()), prev_state, dt_sec)
 
-            anomalies = detect_anomalies(ac, prev_ac, dt_sec)
-            anomalies_str = (" | " + "; ".join(anomalies)) if anomalies else ""
+        for hx, ac in by_hex.items():
+            anomalies = anomalies_by_hex.get(hx, [])
 
+            # Formattazione pigra: le stringhe si costruiscono solo nei rami
+            # che le stampano/scrivono davvero (lo steady-state non formatta).
             if args.print_all:
+                anomalies_str = (" | " + "; ".join(anomalies)) if anomalies else ""
                 print("  " + format_ac_console(ac) + anomalies_str)
 
             # Primo avvistamento (nuovo contatto)
-            if hx not in seen_csv and hx not in added_this_cycle:
-                row = {
-                    "first_seen_utc": now_str,
-                    "hex": ac.hex,
-                    "callsign": ac.flight or "",
-                    "reg": ac.reg or "",
-                    "model_t": ac.model_t or "",
-                    "lat": ac.lat if ac.lat is not None else "",
-                    "lon": ac.lon if ac.lon is not None else "",
-                    "alt_ft": ac.alt_baro if ac.alt_baro is not None else "",
-                    "gs_kt": f"{ac.gs:.0f}" if ac.gs is not None else "",
-                    "note": "; ".join(anomalies) if anomalies else "",
-                }
-                new_rows.append(row)
+            if hx not in seen_hex and hx not in added_this_cycle:
+                new_rows.append(csv_row(ac, now_str, "; ".join(anomalies)))
                 added_this_cycle.add(hx)
 
                 # ----------- Messaggio Telegram per nuovo contatto -----------
@@ -521,32 +1311,13 @@ def main():
                     if anomalies:
                         msg += "\nAnomalie: " + "; ".join(anomalies)
 
-                    # Link dinamici + piattaforme
-                    links = []
-                    hex_code = ac.hex
-                    flight_code = ac.flight or ""
-                    reg_code = ac.reg or ""
-
-                    if hex_code:
-                        links.append(f"[ADSB.fi](https://globe.adsb.fi/?icao={hex_code}): https://globe.adsb.fi/?icao={hex_code}")
-                        links.append(f"[ADSB Exchange](https://globe.adsbexchange.com/?icao={hex_code}): https://globe.adsbexchange.com/?icao={hex_code}")
-                        links.append(f"[Planespotters](https://www.planespotters.net/): https://www.planespotters.net/hex/{hex_code}")
-
-                    if flight_code:
-                        links.append(f"[FlightAware](https://www.flightaware.com/): https://flightaware.com/live/flight/{flight_code}")
-
-                    if reg_code:
-                        links.append(f"[AirHistory](https://www.airhistory.net/): https://www.airhistory.net/marks-all/{reg_code}")
-                        links.append(f"[JetPhotos](https://www.jetphotos.com/): https://www.jetphotos.com/registration/{reg_code}")
-
+                    # Link piattaforme (blocco memoizzato per hex/flt/reg)
+                    links = _links_for(ac.hex, ac.flight or "", ac.reg or "")
                     if links:
-                        msg += "\n\n" + "\n".join(links)
+                        msg += "\n\n" + links
 
                     send_telegram(msg)
 
-            # Aggiorna runtime
-            seen_runtime[hx] = ac
-
             # 🔹 Blocco per i voli militari — invia NOTIFICA arricchita con link
             if ac.is_mil:
                 # print console
@@ -554,19 +1325,7 @@ def main():
 
                 # prepara riga CSV per MIL solo se non già aggiunta
                 if hx not in added_this_cycle:
-                    row = {
-                        "first_seen_utc": now_str,
-                        "hex": ac.hex,
-                        "callsign": ac.flight or "",
-                        "reg": ac.reg or "",
-                        "model_t": ac.model_t or "",
-                        "lat": ac.lat if ac.lat is not None else "",
-                        "lon": ac.lon if ac.lon is not None else "",
-                        "alt_ft": ac.alt_baro if ac.alt_baro is not None else "",
-                        "gs_kt": f"{ac.gs:.0f}" if ac.gs is not None else "",
-                        "note": "mil"
-                    }
-                    new_rows.append(row)
+                    new_rows.append(csv_row(ac, now_str, "mil"))
                     added_this_cycle.add(hx)
 
                 # invia Telegram con link alle piattaforme — struttura simile all'esempio
@@ -574,38 +1333,33 @@ def main():
                     base_line = format_ac_telegram(ac)
                     msg = f"VOLO MILITARE\n{base_line}\nFlag: military"
 
-                    # Link dinamici (HEX / FLT / REG)
-                    links = []
-                    hex_code = ac.hex
-                    flight_code = ac.flight or ""
-                    reg_code = ac.reg or ""
-
-                    if hex_code:
-                        links.append(f"[ADSB.fi](https://globe.adsb.fi/?icao={hex_code}): https://globe.adsb.fi/?icao={hex_code}")
-                        links.append(f"[ADSB Exchange](https://globe.adsbexchange.com/?icao={hex_code}): https://globe.adsbexchange.com/?icao={hex_code}")
-                        links.append(f"[Planespotters](https://www.planespotters.net/hex/{hex_code}): https://www.planespotters.net/hex/{hex_code}")
-
-                    if flight_code:
-                        links.append(f"[FlightAware](https://www.flightaware.com/): https://flightaware.com/live/flight/{flight_code}")
-
-                    if reg_code:
-                        links.append(f"[AirHistory](https://www.airhistory.net/): https://www.airhistory.net/marks-all/{reg_code}")
-                        links.append(f"[JetPhotos](https://www.jetphotos.com/): https://www.jetphotos.com/registration/{reg_code}")
-
-                    # link alla posizione (Google Maps) già incluso in base_line; ripetiamo se vuoi anche come link diretto
+                    # Link piattaforme (memoizzati) + posizione dinamica:
+                    # Google Maps dipende da lat/lon, quindi resta fuori cache
+                    links = _links_for(ac.hex, ac.flight or "", ac.reg or "")
                     if ac.lat is not None and ac.lon is not None:
-                        links.append(f"[Google Maps]({f'https://maps.google.com/?q={ac.lat:.6f},{ac.lon:.6f}'}): https://maps.google.com/?q={ac.lat:.6f},{ac.lon:.6f}")
+                        map_url = f"https://maps.google.com/?q={ac.lat:.6f},{ac.lon:.6f}"
+                        gm = f"[Google Maps]({map_url}): {map_url}"
+                        links = links + "\n" + gm if links else gm
 
                     if links:
-                        msg += "\n\n" + "\n".join(links)
+                        msg += "\n\n" + links
 
                     send_telegram(msg)
 
-        # Scrivi eventuali nuovi contatti su CSV
+        # Scrivi eventuali nuovi contatti su CSV (writer persistente)
         if new_rows:
-            append_seen_csv(args.csv, new_rows)
-            for r in new_rows:
-                seen_csv[r["hex"]] = r
+            try:
+                csv_writer.writerows(new_rows)
+                csv_file.flush()
+            except Exception as e:
+                print(f"[WARN] Scrittura CSV fallita: {e}", file=sys.stderr)
+            fresh = {r[1] for r in new_rows} - seen_hex   # r[1] = hex
+            seen_hex |= fresh
+            try:
+                hex_file.write("".join(hx + "\n" for hx in fresh))
+                hex_file.flush()
+            except Exception as e:
+                print(f"[WARN] Scrittura sidecar hex fallita: {e}", file=sys.stderr)
 
         last_poll_time = time.time()
         elapsed = time.time() - t0